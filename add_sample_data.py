@@ -4,7 +4,9 @@ Script to add sample bot and Q&A pairs for testing the rule engine.
 Run this after database.py to populate with realistic data.
 """
 
-from db import add_bot, add_qna, fetch_bot_by_slug, fetch_qna
+import sys
+
+from db import add_bot, add_qna_bulk, fetch_bot_by_slug, fetch_qna
 
 def create_sample_bot():
     """Create a sample business bot with realistic Q&A pairs."""
@@ -102,23 +104,17 @@ def create_sample_bot():
         }
     ]
     
-    # Add all Q&A pairs
-    added_count = 0
-    for qna in sample_qnas:
-        qna_id = add_qna(
-            bot_id=bot_id,
-            question=qna["question"],
-            answer=qna["answer"],
-            keywords=qna["keywords"],
-            priority=qna["priority"]
-        )
-        if qna_id:
-            added_count += 1
-            print(f"  ✅ Added: {qna['question'][:50]}...")
-        else:
-            print(f"  ❌ Failed: {qna['question'][:50]}...")
-    
-    print(f"\n🎉 Successfully added {added_count}/{len(sample_qnas)} Q&A pairs!")
+    # Add all Q&A pairs in one transaction
+    added_count = add_qna_bulk(bot_id, [
+        (qna["question"], qna["answer"], qna["keywords"], qna["priority"])
+        for qna in sample_qnas
+    ])
+    
+    # Report in one write instead of a print (and flush) per line
+    status = "  ✅ Added" if added_count else "  ❌ Failed"
+    lines = [f"{status}: {qna['question'][:50]}..." for qna in sample_qnas]
+    lines.append(f"\n🎉 Successfully added {added_count}/{len(sample_qnas)} Q&A pairs!")
+    sys.stdout.write("\n".join(lines) + "\n")
     return bot_id
 
 def create_tech_support_bot():
@@ -158,42 +154,44 @@ def create_tech_support_bot():
         }
     ]
     
-    added_count = 0
-    for qna in tech_qnas:
-        qna_id = add_qna(bot_id, qna["question"], qna["answer"], qna["keywords"], qna["priority"])
-        if qna_id:
-            added_count += 1
+    added_count = add_qna_bulk(bot_id, [
+        (qna["question"], qna["answer"], qna["keywords"], qna["priority"])
+        for qna in tech_qnas
+    ])
     
     print(f"✅ Added {added_count} tech support Q&As")
     return bot_id
 
 def display_sample_data():
     """Display the created sample data for verification."""
-    print("\n" + "="*60)
-    print("SAMPLE DATA SUMMARY")
-    print("="*60)
+    lines = []
+    lines.append("\n" + "="*60)
+    lines.append("SAMPLE DATA SUMMARY")
+    lines.append("="*60)
     
     # Show coffee shop bot
     cafe_bot = fetch_bot_by_slug("cozy-cafe")
     if cafe_bot:
-        print(f"\n☕ {cafe_bot['name']} (slug: {cafe_bot['slug']})")
-        print(f"   Theme: {cafe_bot['theme']}, Visibility: {cafe_bot['visibility']}")
+        lines.append(f"\n☕ {cafe_bot['name']} (slug: {cafe_bot['slug']})")
+        lines.append(f"   Theme: {cafe_bot['theme']}, Visibility: {cafe_bot['visibility']}")
         
         qnas = fetch_qna(cafe_bot['id'])
-        print(f"   Q&A Pairs: {len(qnas)}")
+        lines.append(f"   Q&A Pairs: {len(qnas)}")
         
-        print("\n   Sample Q&As:")
+        lines.append("\n   Sample Q&As:")
         for qna in qnas[:3]:  # Show first 3
-            print(f"   • Q: {qna['question']}")
-            print(f"     A: {qna['answer'][:60]}...")
-            print(f"     Keywords: {qna['keywords']}, Priority: {qna['priority']}\n")
+            lines.append(f"   • Q: {qna['question']}")
+            lines.append(f"     A: {qna['answer'][:60]}...")
+            lines.append(f"     Keywords: {qna['keywords']}, Priority: {qna['priority']}\n")
     
     # Show tech bot
     tech_bot = fetch_bot_by_slug("tech-helper")
     if tech_bot:
-        print(f"🔧 {tech_bot['name']} (slug: {tech_bot['slug']})")
+        lines.append(f"🔧 {tech_bot['name']} (slug: {tech_bot['slug']})")
         qnas = fetch_qna(tech_bot['id'])
-        print(f"   Q&A Pairs: {len(qnas)}\n")
+        lines.append(f"   Q&A Pairs: {len(qnas)}\n")
+    
+    sys.stdout.write("\n".join(lines) + "\n")
 
 if __name__ == "__main__":
     print("🚀 Adding sample data for rule engine testing...\n")
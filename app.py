@@ -8,13 +8,33 @@ Endpoints:
 """
 
 import os
+import time
+import hashlib
+import threading
 from flask import Flask, request, jsonify
-from rules import match_rule
+from rules import match_rule, CACHE_TTL_SECONDS
+from db import add_write_listener
 from flask_cors import CORS
 
 app = Flask(__name__)
 CORS(app)
 
+# Serialized GET /api/bots/<slug> bodies: slug -> (etag, body, cached_at).
+# Cleared on writes through db.py; entries expire like the rule engine's cache.
+# A miss only stores its body if no write bumped the generation while it was
+# reading, so a body read just before a write isn't cached after the clear.
+_bot_payloads = {}
+_bot_payloads_lock = threading.Lock()
+_bot_payloads_generation = 0
+
+def _clear_bot_payloads():
+    global _bot_payloads_generation
+    with _bot_payloads_lock:
+        _bot_payloads.clear()
+        _bot_payloads_generation += 1
+
+add_write_listener(_clear_bot_payloads)
+
 @app.route("/health", methods=["GET"])
 def health_check():
     """Simple health check endpoint."""
@@ -58,23 +78,25 @@ def create_bot():
         return jsonify({"error": "Missing bot name or slug"}), 400
     
     # Import the database functions we need
-    from db import add_bot, add_qna
+    from db import create_bot_with_pairs
     
-    # Create the bot
-    bot_id = add_bot(
+    # Create the bot and its Q&A pairs in one transaction
+    pairs = []
+    for pair in data.get("pairs", []):
+        if pair.get("question") and pair.get("answer"):
+            if not isinstance(pair["question"], str) or not isinstance(pair["answer"], str):
+                return jsonify({"error": "Pair question and answer must be strings"}), 400
+            pairs.append((pair["question"], pair["answer"], None, 1))
+    bot_id = create_bot_with_pairs(
         slug=data["slug"],
         name=data["name"], 
-        theme=data.get("theme", "arctic")
+        theme=data.get("theme", "arctic"),
+        pairs=pairs
     )
     
     if not bot_id:
         return jsonify({"error": "Bot with this slug already exists"}), 409
     
-    # Add Q&A pairs
-    for pair in data.get("pairs", []):
-        if pair.get("question") and pair.get("answer"):
-            add_qna(bot_id, pair["question"], pair["answer"])
-    
     return jsonify({
         "success": True, 
         "link": f"/chat/{data['slug']}"
@@ -85,18 +107,33 @@ def get_bot(slug):
     """Get bot details for the chat page"""
     from db import fetch_bot_by_slug, fetch_qna
     
-    bot = fetch_bot_by_slug(slug)
-    if not bot:
-        return jsonify({"error": "Bot not found"}), 404
-    
-    pairs = fetch_qna(bot["id"])
+    with _bot_payloads_lock:
+        cached = _bot_payloads.get(slug)
+        generation = _bot_payloads_generation
+    if cached and time.monotonic() - cached[2] < CACHE_TTL_SECONDS:
+        etag, body = cached[0], cached[1]
+    else:
+        bot = fetch_bot_by_slug(slug)
+        if not bot:
+            return jsonify({"error": "Bot not found"}), 404
+        
+        pairs = fetch_qna(bot["id"])
+        
+        body = app.json.dumps({
+            "name": bot["name"],
+            "slug": bot["slug"], 
+            "theme": bot["theme"],
+            "pairs": [{"question": p["question"], "answer": p["answer"]} for p in pairs]
+        }).encode("utf-8")
+        etag = hashlib.sha1(body).hexdigest()
+        with _bot_payloads_lock:
+            if generation == _bot_payloads_generation:
+                _bot_payloads[slug] = (etag, body, time.monotonic())
     
-    return jsonify({
-        "name": bot["name"],
-        "slug": bot["slug"], 
-        "theme": bot["theme"],
-        "pairs": [{"question": p["question"], "answer": p["answer"]} for p in pairs]
-    })
+    # Answers If-None-Match with an empty 304 when the client's copy is current
+    response = app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    return response.make_conditional(request)
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
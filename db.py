@@ -1,26 +1,132 @@
 import sqlite3
 import os
-from datetime import datetime
+import json
+import time
+import atexit
+import threading
 from contextlib import contextmanager
 
+from textnorm import NORMALIZER_VERSION, normalize_text, split_keywords
+
 # Path to the SQLite database file
 DB_PATH = os.path.join(os.path.dirname(__file__), "..", "shared", "rulebot.db")
 
+# PRAGMAs applied to every new connection
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-64000",
+)
+
+# Timestamps are generated by SQLite, in the same ISO-8601 UTC format as before
+_NOW = "strftime('%Y-%m-%dT%H:%M:%f', 'now')"
+
+# Parametric SQL shared by all callers. sqlite3 keeps a per-connection cache of
+# prepared statements keyed on the SQL text, so with pooled connections each
+# statement is parsed and planned once per thread and reused afterwards.
+_SQL = {
+    "insert_bot": f"""
+        INSERT INTO bots (slug, name, owner_id, theme, avatar, visibility, fallback_message, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, {_NOW}, {_NOW})
+    """,
+    "insert_bot_minimal": f"""
+        INSERT INTO bots (slug, name, theme, created_at, updated_at)
+        VALUES (?, ?, ?, {_NOW}, {_NOW})
+    """,
+    "insert_qna": f"""
+        INSERT INTO qna (bot_id, question, answer, keywords, priority, created_at,
+                         question_norm, keywords_plain, keywords_regex)
+        VALUES (?, ?, ?, ?, ?, {_NOW}, ?, ?, ?)
+    """,
+    "fetch_qna": """
+        SELECT id, question, answer, keywords, priority,
+               question_norm, keywords_plain, keywords_regex
+        FROM qna
+        WHERE bot_id = ?
+        ORDER BY priority DESC, id ASC
+    """,
+    "fetch_bot_by_slug": """
+        SELECT id, slug, name, owner_id, theme, avatar, visibility, fallback_message, created_at, updated_at
+        FROM bots
+        WHERE slug = ?
+    """,
+    "fetch_bot_by_id": """
+        SELECT id, slug, name, owner_id, theme, avatar, visibility, fallback_message, created_at, updated_at
+        FROM bots
+        WHERE id = ?
+    """,
+    "fetch_bot_with_qna": """
+        SELECT b.id AS bot_id, b.slug, b.name, b.fallback_message,
+               q.id, q.question, q.answer, q.keywords, q.priority,
+               q.question_norm, q.keywords_plain, q.keywords_regex
+        FROM bots b
+        LEFT JOIN qna q ON q.bot_id = b.id
+        WHERE b.slug = ?
+        ORDER BY q.priority DESC, q.id ASC
+    """,
+    "delete_qna": "DELETE FROM qna WHERE id = ?",
+    "upsert_bot_stats": """
+        INSERT INTO bot_stats (bot_id, date, daily_sessions, message_count)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(bot_id, date) DO UPDATE SET
+            daily_sessions = daily_sessions + excluded.daily_sessions,
+            message_count = message_count + excluded.message_count
+    """,
+    "insert_user": f"""
+        INSERT INTO users (email, created_at)
+        VALUES (?, {_NOW})
+    """,
+    "fetch_user_by_email": "SELECT id, email, created_at FROM users WHERE email = ?",
+}
+
+# One long-lived connection per thread, reused across requests
+_local = threading.local()
+
+# Buffered stats increments: (bot_id, date) -> [sessions, messages]
+STATS_FLUSH_INTERVAL = 0.5  # seconds
+STATS_FLUSH_OPS = 500
+_stats_buffer = {}
+_stats_lock = threading.Lock()
+_stats_ops = 0
+_stats_flusher = None
+
+# Callbacks run after any write that changes bot or Q&A data
+_write_listeners = []
+
+def add_write_listener(callback):
+    """Register a no-argument callable to run after bot/Q&A data changes (e.g. to drop caches)."""
+    _write_listeners.append(callback)
+
+def _notify_write():
+    for callback in _write_listeners:
+        callback()
+
+def _connect():
+    """Open a new connection with the row factory and PRAGMAs applied."""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+    conn.row_factory = sqlite3.Row  # Enable dictionary-like access
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
 @contextmanager
 def get_db_connection():
-    """Get a connection to the SQLite database with proper cleanup."""
-    conn = None
+    """
+    Get this thread's pooled connection to the SQLite database.
+    The connection is kept open so its page cache stays warm; any open
+    transaction is rolled back if the block raises.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _connect()
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row  # Enable dictionary-like access
         yield conn
-    except sqlite3.Error as e:
-        if conn:
+    except Exception:
+        if conn.in_transaction:
             conn.rollback()
-        raise e
-    finally:
-        if conn:
-            conn.close()
+        raise
 
 def init_db():
     """Create tables if they don't exist."""
@@ -28,6 +134,12 @@ def init_db():
         with get_db_connection() as conn:
             cur = conn.cursor()
 
+            # WAL is stored in the database file, so readers stop blocking
+            # writers for every later connection too
+            journal_mode = cur.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+            if journal_mode.lower() != "wal":
+                print(f"Warning: could not enable WAL (journal_mode={journal_mode}).")
+
             # Table for storing bots
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS bots (
@@ -54,10 +166,41 @@ def init_db():
                     keywords TEXT,
                     priority INTEGER DEFAULT 1,
                     created_at TEXT NOT NULL,
+                    question_norm TEXT,
+                    keywords_plain TEXT,
+                    keywords_regex TEXT,
                     FOREIGN KEY (bot_id) REFERENCES bots (id) ON DELETE CASCADE
                 );
             """)
 
+            # Precomputed matching columns, for databases created before them
+            columns = {row["name"] for row in cur.execute("PRAGMA table_info(qna)")}
+            for column in ("question_norm", "keywords_plain", "keywords_regex"):
+                if column not in columns:
+                    cur.execute(f"ALTER TABLE qna ADD COLUMN {column} TEXT")
+
+            # user_version records the NORMALIZER_VERSION the stored columns were
+            # computed with; any other version means every row is stale
+            stored_version = cur.execute("PRAGMA user_version").fetchone()[0]
+            if stored_version == NORMALIZER_VERSION:
+                stale = cur.execute("SELECT id, question, keywords FROM qna WHERE question_norm IS NULL").fetchall()
+            else:
+                stale = cur.execute("SELECT id, question, keywords FROM qna").fetchall()
+            if stale or stored_version != NORMALIZER_VERSION:
+                cur.execute("BEGIN IMMEDIATE")
+                cur.executemany("""
+                    UPDATE qna SET question_norm = ?, keywords_plain = ?, keywords_regex = ? WHERE id = ?
+                """, [(*_precompute_qna(row["question"], row["keywords"]), row["id"]) for row in stale])
+                cur.execute(f"PRAGMA user_version = {NORMALIZER_VERSION:d}")
+                conn.commit()
+
+            # Lets fetch_qna read a bot's rows already in priority order.
+            # bots.slug needs no extra index: UNIQUE already creates one.
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_qna_bot_prio
+                ON qna (bot_id, priority DESC, id ASC);
+            """)
+
             # Table for basic stats
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS bot_stats (
@@ -93,17 +236,14 @@ def add_bot(slug, name, owner_id=None, theme='light', avatar=None, visibility='u
     try:
         with get_db_connection() as conn:
             cur = conn.cursor()
-            now = datetime.utcnow().isoformat()
             
             if fallback_message is None:
                 fallback_message = "Sorry, I didn't understand that. Can you rephrase your question?"
             
-            cur.execute("""
-                INSERT INTO bots (slug, name, owner_id, theme, avatar, visibility, fallback_message, created_at, updated_at) 
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (slug, name, owner_id, theme, avatar, visibility, fallback_message, now, now))
+            cur.execute(_SQL["insert_bot"], (slug, name, owner_id, theme, avatar, visibility, fallback_message))
             
             conn.commit()
+            _notify_write()
             return cur.lastrowid
     except sqlite3.IntegrityError:
         print(f"Bot with slug '{slug}' already exists.")
@@ -112,35 +252,85 @@ def add_bot(slug, name, owner_id=None, theme='light', avatar=None, visibility='u
         print(f"Error adding bot: {e}")
         return None
 
+def _precompute_qna(question, keywords):
+    """Matching columns for a Q&A row: (question_norm, keywords_plain, keywords_regex)."""
+    # SQLite stores non-string values in these TEXT columns as text, so match on that
+    plain, regexes = split_keywords(None if keywords is None else str(keywords))
+    return normalize_text(str(question)), json.dumps(plain), json.dumps(regexes)
+
 def add_qna(bot_id, question, answer, keywords=None, priority=1):
     """Add a Q&A pair to a specific bot."""
     try:
         with get_db_connection() as conn:
             cur = conn.cursor()
-            now = datetime.utcnow().isoformat()
             
-            cur.execute("""
-                INSERT INTO qna (bot_id, question, answer, keywords, priority, created_at) 
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (bot_id, question, answer, keywords, priority, now))
+            cur.execute(_SQL["insert_qna"], (bot_id, question, answer, keywords, priority, *_precompute_qna(question, keywords)))
             
             conn.commit()
+            _notify_write()
             return cur.lastrowid
     except sqlite3.Error as e:
         print(f"Error adding Q&A: {e}")
         return None
 
+def add_qna_bulk(bot_id, rows):
+    """
+    Add many Q&A pairs to a bot in a single transaction.
+    Each row is a (question, answer, keywords, priority) tuple.
+    Returns the number of rows inserted, or 0 on error.
+    """
+    try:
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+
+            cur.execute("BEGIN IMMEDIATE")
+            _insert_qna_rows(cur, bot_id, rows)
+
+            conn.commit()
+            _notify_write()
+            return cur.rowcount
+    except sqlite3.Error as e:
+        print(f"Error adding Q&A pairs: {e}")
+        return 0
+
+def _insert_qna_rows(cur, bot_id, rows):
+    """executemany the Q&A INSERT for (question, answer, keywords, priority) rows."""
+    cur.executemany(_SQL["insert_qna"], [
+        (bot_id, question, answer, keywords, priority, *_precompute_qna(question, keywords))
+        for question, answer, keywords, priority in rows
+    ])
+
+def create_bot_with_pairs(slug, name, theme='light', pairs=()):
+    """
+    Add a new bot and its Q&A pairs in a single transaction.
+    Each pair is a (question, answer, keywords, priority) tuple.
+    Returns the new bot's ID, or None if the slug is taken or on error.
+    """
+    try:
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute(_SQL["insert_bot_minimal"], (slug, name, theme))
+            bot_id = cur.lastrowid
+            _insert_qna_rows(cur, bot_id, pairs)
+
+            conn.commit()
+            _notify_write()
+            return bot_id
+    except sqlite3.IntegrityError:
+        print(f"Bot with slug '{slug}' already exists.")
+        return None
+    except sqlite3.Error as e:
+        print(f"Error creating bot: {e}")
+        return None
+
 def fetch_qna(bot_id):
     """Fetch all Q&A pairs for a specific bot, ordered by priority (highest first)."""
     try:
         with get_db_connection() as conn:
             cur = conn.cursor()
-            cur.execute("""
-                SELECT id, question, answer, keywords, priority 
-                FROM qna 
-                WHERE bot_id = ? 
-                ORDER BY priority DESC, id ASC
-            """, (bot_id,))
+            cur.execute(_SQL["fetch_qna"], (bot_id,))
             return cur.fetchall()
     except sqlite3.Error as e:
         print(f"Error fetching Q&A: {e}")
@@ -151,26 +341,60 @@ def fetch_bot_by_slug(slug):
     try:
         with get_db_connection() as conn:
             cur = conn.cursor()
-            cur.execute("""
-                SELECT id, slug, name, owner_id, theme, avatar, visibility, fallback_message, created_at, updated_at 
-                FROM bots 
-                WHERE slug = ?
-            """, (slug,))
+            cur.execute(_SQL["fetch_bot_by_slug"], (slug,))
             return cur.fetchone()
     except sqlite3.Error as e:
         print(f"Error fetching bot: {e}")
         return None
 
+def fetch_bot_with_qna(slug):
+    """
+    Fetch a bot and its Q&A pairs (highest priority first) in one query.
+    Returns (bot, qnas) as plain dicts, or (None, []) if the bot doesn't exist.
+    """
+    try:
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            cur.row_factory = None  # plain tuples; unpacked by position below
+            cur.execute(_SQL["fetch_bot_with_qna"], (slug,))
+            rows = cur.fetchall()
+    except sqlite3.Error as e:
+        print(f"Error fetching bot: {e}")
+        return None, []
+
+    if not rows:
+        return None, []
+
+    bot_id, bot_slug, name, fallback_message = rows[0][:4]
+    bot = {
+        "id": bot_id,
+        "slug": bot_slug,
+        "name": name,
+        "fallback_message": fallback_message,
+    }
+    qnas = [
+        {
+            "id": qna_id,
+            "question": question,
+            "answer": answer,
+            "keywords": keywords,
+            "priority": priority,
+            "question_norm": question_norm,
+            "keywords_plain": keywords_plain,
+            "keywords_regex": keywords_regex,
+        }
+        for (_, _, _, _, qna_id, question, answer, keywords, priority,
+             question_norm, keywords_plain, keywords_regex) in rows
+        if qna_id is not None  # LEFT JOIN row for a bot with no Q&As
+    ]
+    return bot, qnas
+
 def fetch_bot_by_id(bot_id):
     """Fetch bot information by its ID."""
     try:
         with get_db_connection() as conn:
             cur = conn.cursor()
-            cur.execute("""
-                SELECT id, slug, name, owner_id, theme, avatar, visibility, fallback_message, created_at, updated_at 
-                FROM bots 
-                WHERE id = ?
-            """, (bot_id,))
+            cur.execute(_SQL["fetch_bot_by_id"], (bot_id,))
             return cur.fetchone()
     except sqlite3.Error as e:
         print(f"Error fetching bot: {e}")
@@ -185,15 +409,13 @@ def update_bot(bot_id, **kwargs):
         with get_db_connection() as conn:
             cur = conn.cursor()
             
-            # Add updated_at timestamp
-            kwargs['updated_at'] = datetime.utcnow().isoformat()
-            
-            # Build dynamic SQL
-            set_clause = ", ".join([f"{key} = ?" for key in kwargs.keys()])
+            # Build dynamic SQL, stamping updated_at
+            set_clause = ", ".join([f"{key} = ?" for key in kwargs.keys()] + [f"updated_at = {_NOW}"])
             values = list(kwargs.values()) + [bot_id]
             
             cur.execute(f"UPDATE bots SET {set_clause} WHERE id = ?", values)
             conn.commit()
+            _notify_write()
             
             return cur.rowcount > 0
     except sqlite3.Error as e:
@@ -205,45 +427,86 @@ def delete_qna(qna_id):
     try:
         with get_db_connection() as conn:
             cur = conn.cursor()
-            cur.execute("DELETE FROM qna WHERE id = ?", (qna_id,))
+            cur.execute(_SQL["delete_qna"], (qna_id,))
             conn.commit()
+            _notify_write()
             return cur.rowcount > 0
     except sqlite3.Error as e:
         print(f"Error deleting Q&A: {e}")
         return False
 
 def increment_bot_stats(bot_id, sessions=0, messages=0):
-    """Increment daily stats for a bot."""
+    """
+    Increment daily stats for a bot.
+    Increments are buffered in memory and written in batches by
+    flush_bot_stats(), every STATS_FLUSH_INTERVAL seconds or after
+    STATS_FLUSH_OPS increments, whichever comes first.
+    """
+    global _stats_ops, _stats_flusher
+    today = time.strftime("%Y-%m-%d", time.gmtime())
+
+    with _stats_lock:
+        counts = _stats_buffer.setdefault((bot_id, today), [0, 0])
+        counts[0] += sessions
+        counts[1] += messages
+        _stats_ops += 1
+        flush_now = _stats_ops >= STATS_FLUSH_OPS
+
+        if _stats_flusher is None or not _stats_flusher.is_alive():
+            _stats_flusher = threading.Thread(target=_flush_stats_periodically, daemon=True)
+            _stats_flusher.start()
+
+    if flush_now:
+        flush_bot_stats()
+    return True
+
+def flush_bot_stats():
+    """Write all buffered stats increments in a single transaction."""
+    global _stats_ops
+    with _stats_lock:
+        pending = dict(_stats_buffer)
+        _stats_buffer.clear()
+        _stats_ops = 0
+
+    if not pending:
+        return True
+
     try:
         with get_db_connection() as conn:
             cur = conn.cursor()
-            today = datetime.utcnow().date().isoformat()
-            
-            cur.execute("""
-                INSERT INTO bot_stats (bot_id, date, daily_sessions, message_count)
-                VALUES (?, ?, ?, ?)
-                ON CONFLICT(bot_id, date) DO UPDATE SET
-                    daily_sessions = daily_sessions + ?,
-                    message_count = message_count + ?
-            """, (bot_id, today, sessions, messages, sessions, messages))
-            
+
+            cur.execute("BEGIN IMMEDIATE")
+            cur.executemany(_SQL["upsert_bot_stats"], [
+                (bot_id, date, sessions, messages)
+                for (bot_id, date), (sessions, messages) in pending.items()
+            ])
+
             conn.commit()
             return True
     except sqlite3.Error as e:
         print(f"Error updating bot stats: {e}")
+        # Keep the increments so the next flush retries them
+        with _stats_lock:
+            for key, (sessions, messages) in pending.items():
+                counts = _stats_buffer.setdefault(key, [0, 0])
+                counts[0] += sessions
+                counts[1] += messages
         return False
 
+def _flush_stats_periodically():
+    while True:
+        time.sleep(STATS_FLUSH_INTERVAL)
+        flush_bot_stats()
+
+atexit.register(flush_bot_stats)
+
 def create_user(email):
     """Create a new user."""
     try:
         with get_db_connection() as conn:
             cur = conn.cursor()
-            now = datetime.utcnow().isoformat()
             
-            cur.execute("""
-                INSERT INTO users (email, created_at) 
-                VALUES (?, ?)
-            """, (email, now))
+            cur.execute(_SQL["insert_user"], (email,))
             
             conn.commit()
             return cur.lastrowid
@@ -259,7 +522,7 @@ def fetch_user_by_email(email):
     try:
         with get_db_connection() as conn:
             cur = conn.cursor()
-            cur.execute("SELECT id, email, created_at FROM users WHERE email = ?", (email,))
+            cur.execute(_SQL["fetch_user_by_email"], (email,))
             return cur.fetchone()
     except sqlite3.Error as e:
         print(f"Error fetching user: {e}")
@@ -2,20 +2,26 @@
 Rule Engine for RuleBot
 - Matches a user's message to the best Q&A for a given bot.
 - Uses: keywords (CSV), optional regex (prefix with `re:` or wrap in /slashes/),
-  priority weighting, exact-match bonus, and similarity scoring.
+  priority weighting, exact-match bonus, and similarity scoring (token-set
+  Jaccard for every row, SequenceMatcher for the few best candidates).
 - Minimal deps: stdlib only. Works with the db.py already set up.
 """
 
 from __future__ import annotations
 import os
+import heapq
+import json
 import re
+import time
 from difflib import SequenceMatcher
-from typing import Dict, List, Tuple, Any, Optional
+from functools import lru_cache
+from typing import Dict, List, Tuple, Any, Optional, NamedTuple, Set, Iterable
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from db import fetch_bot_by_slug, fetch_qna
+from db import fetch_bot_with_qna, add_write_listener
+from textnorm import normalize_text, split_keywords
 
 # ---- Tunable weights ---------------------------------------------------------
 
@@ -25,73 +31,47 @@ EXACT_MATCH_BONUS = 40    # if user's text == question (normalized)
 PRIORITY_WEIGHT = 2       # multiplied by qna['priority']
 SIMILARITY_WEIGHT = 30    # similarity ratio (0..1) * this weight
 SIMILARITY_MIN_FOR_MATCH = 0.55  # below this, similarity alone won't count as a match
+SIMILARITY_RERANK_TOP = 5  # best Jaccard-scored rows re-scored with SequenceMatcher
 
 DEBUG = os.getenv("RULEBOT_DEBUG") == "1"
 
-# ---- Helpers ----------------------------------------------------------------
-
-_norm_ws = re.compile(r"\s+")
-_strip_chars = re.compile(r"[^a-z0-9\s]+")
+# Cached bots/Q&As are dropped on writes made through db.py, and expire after
+# this many seconds to pick up writes from other processes.
+CACHE_TTL_SECONDS = max(1, int(os.getenv("RULEBOT_CACHE_TTL", "60")))
 
-def normalize_text(text: str) -> str:
-    """Lowercase, strip punctuation (keep spaces), collapse whitespace."""
-    t = text.strip().lower()
-    t = _strip_chars.sub(" ", t)
-    t = _norm_ws.sub(" ", t)
-    return t
+# ---- Helpers ----------------------------------------------------------------
 
 def tokenize(text: str) -> List[str]:
     return [tok for tok in text.split(" ") if tok]
 
-def parse_keywords(keywords: Optional[str]) -> Tuple[List[str], List[re.Pattern]]:
-    """
-    Split a CSV keywords string into:
-      - plain phrases (list[str])
-      - compiled regex patterns (list[Pattern])
-    Conventions:
-      - 're:^foo$'   -> regex
-      - '/foo|bar/i' -> regex (with trailing '/i' for IGNORECASE)
-      - plain words/phrases -> phrase matches
-    """
-    plain: List[str] = []
-    patterns: List[re.Pattern] = []
-    if not keywords:
-        return plain, patterns
-
-    for raw in keywords.split(","):
-        kw = raw.strip()
-        if not kw:
-            continue
+def token_set(text: str) -> frozenset:
+    return frozenset(tokenize(text))
 
-        # re: pattern
-        if kw.startswith("re:"):
-            pat = kw[3:].strip()
-            try:
-                patterns.append(re.compile(pat, flags=re.IGNORECASE))
-            except re.error:
-                # ignore bad regex silently
-                pass
-            continue
+def token_mask(tokens: Iterable[str]) -> int:
+    """64-bit Bloom-style mask with one hashed bit per token."""
+    mask = 0
+    for tok in tokens:
+        mask |= 1 << (hash(tok) & 63)
+    return mask
 
-        # /pattern/flags
-        if len(kw) >= 2 and kw.startswith("/") and kw.count("/") >= 2:
-            # find last slash
-            last = kw.rfind("/")
-            pat = kw[1:last]
-            flags_str = kw[last + 1:].lower()
-            flags = 0
-            if "i" in flags_str:
-                flags |= re.IGNORECASE
-            try:
-                patterns.append(re.compile(pat, flags=flags))
-            except re.error:
-                pass
-            continue
+def jaccard(a: frozenset, b: frozenset) -> float:
+    """|a & b| / |a | b| for two token sets (0.0 if either is empty)."""
+    if not a or not b:
+        return 0.0
+    inter = len(a & b)
+    return inter / (len(a) + len(b) - inter)
 
-        # otherwise a plain phrase
-        plain.append(kw.lower())
+@lru_cache(maxsize=4096)
+def compile_pattern(pattern: str, flags: int) -> re.Pattern:
+    return re.compile(pattern, flags=flags)
 
-    return plain, patterns
+def parse_keywords(keywords: Optional[str]) -> Tuple[List[str], List[re.Pattern]]:
+    """
+    Split a CSV keywords string into plain phrases (list[str]) and compiled
+    regex patterns (list[Pattern]). See textnorm.split_keywords for the syntax.
+    """
+    plain, regexes = split_keywords(keywords)
+    return plain, [compile_pattern(pat, flags) for pat, flags in regexes]
 
 def phrase_in_text(text: str, phrase: str) -> bool:
     """
@@ -108,32 +88,226 @@ def phrase_in_text(text: str, phrase: str) -> bool:
     # multi-word phrase -> substring on normalized text
     return phrase in text
 
+Artifacts = Tuple[str, frozenset, Tuple[str, ...], Tuple[re.Pattern, ...]]
+
+@lru_cache(maxsize=4096)
+def _stored_artifacts(question_norm: str, keywords_plain: Optional[str], keywords_regex: Optional[str]) -> Artifacts:
+    plain = json.loads(keywords_plain) if keywords_plain else []
+    regexes = json.loads(keywords_regex) if keywords_regex else []
+    patterns = tuple(compile_pattern(pat, flags) for pat, flags in regexes)
+    return question_norm, token_set(question_norm), tuple(plain), patterns
+
+@lru_cache(maxsize=4096)
+def _text_artifacts(question: str, keywords: Optional[str]) -> Artifacts:
+    q_norm = normalize_text(question)
+    plain, patterns = parse_keywords(keywords)
+    return q_norm, token_set(q_norm), tuple(plain), tuple(patterns)
+
+def row_priority(qna_row: Any) -> int:
+    return int(qna_row["priority"]) if qna_row["priority"] is not None else 0
+
+def qna_artifacts(qna_row: Any) -> Artifacts:
+    """
+    Normalized question plus parsed keywords for a Q&A row.
+    Uses the columns db.py precomputes at write time, falling back to
+    parsing question/keywords for rows written before those existed.
+    Results are memoized on the row's text, so each regex compiles once.
+    Returns (q_norm, q_tokens, plain, patterns).
+    """
+    if qna_row["question_norm"] is None:
+        return _text_artifacts(qna_row["question"], qna_row["keywords"])
+    return _stored_artifacts(qna_row["question_norm"], qna_row["keywords_plain"], qna_row["keywords_regex"])
+
+class BotIndex(NamedTuple):
+    """A bot's Q&A rows plus matchers precomputed across all of them."""
+    rows: Tuple[Dict[str, Any], ...]
+    word_re: Optional[re.Pattern]  # \b(kw1|kw2|...)\b over every single-word keyword
+    q_tokens: Tuple[frozenset, ...]  # per row, token set of the normalized question
+    q_sizes: Tuple[int, ...]         # per row, len(q_tokens[i])
+    exact: Dict[str, int]            # normalized question -> position of its first row
+    artifacts: Tuple[Artifacts, ...] # per row, qna_artifacts(row)
+    priorities: Tuple[int, ...]      # per row, priority as int (None -> 0)
+    row_words: Tuple[Tuple[str, ...], ...]    # per row, single-word keywords
+    row_phrases: Tuple[Tuple[str, ...], ...]  # per row, multi-word keyword phrases
+    masks: Tuple[int, ...]  # per row, token_mask() of question tokens + single-word keywords (-1 = always score)
+
+def build_index(qnas: Tuple[Dict[str, Any], ...]) -> BotIndex:
+    words = set()
+    q_tokens = []
+    exact: Dict[str, int] = {}
+    row_words = []
+    row_phrases = []
+    masks = []
+    artifacts = tuple(qna_artifacts(row) for row in qnas)
+    for pos, (q_norm, tokens, plain, patterns) in enumerate(artifacts):
+        q_tokens.append(tokens)
+        exact.setdefault(q_norm, pos)
+        row_words.append(tuple(kw for kw in plain if " " not in kw))
+        row_phrases.append(tuple(kw for kw in plain if " " in kw))
+        words.update(row_words[-1])
+        # Phrases and regexes can match across or inside tokens, so rows
+        # using them can't be ruled out by token overlap
+        if row_phrases[-1] or patterns:
+            masks.append(-1)
+        else:
+            masks.append(token_mask(tokens) | token_mask(row_words[-1]))
+    word_re = None
+    if words:
+        alternation = "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+        word_re = re.compile(rf"\b({alternation})\b")
+    priorities = tuple(row_priority(row) for row in qnas)
+    return BotIndex(
+        qnas, word_re, tuple(q_tokens), tuple(len(t) for t in q_tokens), exact,
+        artifacts, priorities, tuple(row_words), tuple(row_phrases), tuple(masks),
+    )
+
+def matched_words(index: BotIndex, user_norm: str) -> Set[str]:
+    """Single-word keywords of any row found in user_norm, in one scan."""
+    if index.word_re is None:
+        return set()
+    return {m.group(1) for m in index.word_re.finditer(user_norm)}
+
+def batch_scores(index: BotIndex, user_norm: str, user_tokens: frozenset, user_words: Set[str]) -> List[int]:
+    """
+    score_artifacts() totals for every row in one pass, without building the
+    per-row details. Assumes no row is an exact match (match_rule checks that
+    first), so the exact bonus is never added here.
+    Rows whose mask shares no bit with the message's tokens and matched
+    keywords can't hit a keyword or share a token, so they score their
+    priority alone without further work.
+    """
+    # user_words can hold keywords word_re found inside a token (e.g. "wifi"
+    # in "wifi…"), so their bits must be in the mask too
+    user_mask = token_mask(user_tokens) | token_mask(user_words)
+    n = len(user_tokens)
+    is_hit = user_words.__contains__
+    scores = []
+    for mask, q_tokens, size, words, phrases, artifacts, priority in zip(
+        index.masks, index.q_tokens, index.q_sizes, index.row_words,
+        index.row_phrases, index.artifacts, index.priorities,
+    ):
+        if not mask & user_mask:
+            scores.append(priority * PRIORITY_WEIGHT)
+            continue
+        inter = len(user_tokens & q_tokens)
+        ratio = inter / (n + size - inter) if inter else 0.0
+        kw_hits = sum(map(is_hit, words))
+        if phrases:
+            kw_hits += sum(phrase in user_norm for phrase in phrases)
+        score = kw_hits * KW_WORD_POINTS + int(round(SIMILARITY_WEIGHT * ratio)) + priority * PRIORITY_WEIGHT
+        patterns = artifacts[3]
+        if patterns:
+            score += KW_REGEX_POINTS * sum(1 for pat in patterns if pat.search(user_norm))
+        scores.append(score)
+    return scores
+
+def rerank_similar(index: BotIndex, user_norm: str, user_tokens: frozenset, scores: List[int]) -> Tuple[int, float]:
+    """
+    Re-score the SIMILARITY_RERANK_TOP best batch_scores() rows with a
+    SequenceMatcher ratio in place of their Jaccard similarity. Jaccard gives
+    no credit for typos or split/joined words ("giftcards" vs "gift cards"),
+    so it only shortlists; the winner and SIMILARITY_MIN_FOR_MATCH use the
+    character-level ratio.
+    Returns (position of the best row, its SequenceMatcher ratio).
+    """
+    best_pos, best_score, best_ratio = -1, 0, 0.0
+    for pos in heapq.nlargest(SIMILARITY_RERANK_TOP, range(len(scores)), key=scores.__getitem__):
+        ratio = SequenceMatcher(None, user_norm, index.artifacts[pos][0]).ratio()
+        score = (
+            scores[pos]
+            - int(round(SIMILARITY_WEIGHT * jaccard(user_tokens, index.q_tokens[pos])))
+            + int(round(SIMILARITY_WEIGHT * ratio))
+        )
+        # Ties go to the higher-priority (earlier) row
+        if best_pos < 0 or score > best_score or (score == best_score and pos < best_pos):
+            best_pos, best_score, best_ratio = pos, score, ratio
+    return best_pos, best_ratio
+
+# ---- Cache -------------------------------------------------------------------
+
+def _ttl_bucket() -> int:
+    return int(time.monotonic() // CACHE_TTL_SECONDS)
+
+# Bumped on every write; part of the cache key so a lookup that was already
+# reading the DB when a write landed caches under a key nobody asks for again.
+_generation = 0
+
+@lru_cache(maxsize=256)
+def _cached_bot(slug: str, _bucket: int, _gen: int) -> Tuple[Optional[Dict[str, Any]], Optional[BotIndex]]:
+    bot, qnas = fetch_bot_with_qna(slug)
+    if not bot:
+        return None, None
+    return bot, build_index(tuple(qnas))
+
+def cached_bot(slug: str) -> Tuple[Optional[Dict[str, Any]], Optional[BotIndex]]:
+    """
+    fetch_bot_with_qna() served from memory.
+    Returns (bot dict, BotIndex over its Q&As), or (None, None) if not found.
+    """
+    if not isinstance(slug, str):
+        # JSON bodies can carry lists/dicts here; they can't be a slug (or a cache key)
+        return None, None
+    return _cached_bot(slug, _ttl_bucket(), _generation)
+
+def invalidate() -> None:
+    """Drop all cached bots and their Q&A indexes."""
+    global _generation
+    _generation += 1
+    _cached_bot.cache_clear()
+
+add_write_listener(invalidate)
+
 # ---- Scoring ----------------------------------------------------------------
 
-def score_qna(user_norm: str, qna_row: Any) -> Tuple[int, Dict[str, Any]]:
+def score_qna(
+    user_norm: str,
+    qna_row: Any,
+    user_tokens: Optional[frozenset] = None,
+    user_words: Optional[Set[str]] = None,
+    ratio: Optional[float] = None,
+) -> Tuple[int, Dict[str, Any]]:
     """
     Compute a score for a single Q&A row.
+    Pass user_tokens (token_set(user_norm)) to avoid re-tokenizing per row,
+    user_words (matched_words(index, user_norm)) to resolve single-word
+    keywords by set lookup instead of a regex search each, and ratio
+    (the jaccard() similarity, if already known) to skip computing it.
     Returns (score, details)
     details includes: matched_keywords, matched_regex, exact, ratio
     """
+    return score_artifacts(user_norm, qna_artifacts(qna_row), row_priority(qna_row),
+                           user_tokens, user_words, ratio)
+
+def score_artifacts(
+    user_norm: str,
+    artifacts: Artifacts,
+    priority: int,
+    user_tokens: Optional[frozenset] = None,
+    user_words: Optional[Set[str]] = None,
+    ratio: Optional[float] = None,
+) -> Tuple[int, Dict[str, Any]]:
+    """score_qna() on a row's precomputed artifacts and priority (see BotIndex)."""
     score = 0
     details = {
         "matched_keywords": [],
         "matched_regex": [],
         "exact": False,
         "ratio": 0.0,
-        "priority": int(qna_row["priority"]) if qna_row["priority"] is not None else 0,
+        "priority": priority,
     }
 
-    q_norm = normalize_text(qna_row["question"])
+    q_norm, q_tokens, plain, patterns = artifacts
     if user_norm == q_norm:
         score += EXACT_MATCH_BONUS
         details["exact"] = True
 
     # Keywords / regex
-    plain, patterns = parse_keywords(qna_row["keywords"])
     for kw in plain:
-        if phrase_in_text(user_norm, kw):
+        if user_words is not None and " " not in kw:
+            hit = kw in user_words
+        else:
+            hit = phrase_in_text(user_norm, kw)
+        if hit:
             score += KW_WORD_POINTS
             details["matched_keywords"].append(kw)
 
@@ -143,12 +317,15 @@ def score_qna(user_norm: str, qna_row: Any) -> Tuple[int, Dict[str, Any]]:
             details["matched_regex"].append(pat.pattern)
 
     # Similarity
-    ratio = SequenceMatcher(None, user_norm, q_norm).ratio()
+    if ratio is None:
+        if user_tokens is None:
+            user_tokens = token_set(user_norm)
+        ratio = jaccard(user_tokens, q_tokens)
     details["ratio"] = ratio
     score += int(round(SIMILARITY_WEIGHT * ratio))
 
     # Priority
-    score += details["priority"] * PRIORITY_WEIGHT
+    score += priority * PRIORITY_WEIGHT
 
     return score, details
 
@@ -166,7 +343,7 @@ def match_rule(bot_slug: str, user_message: str) -> Dict[str, Any]:
           "debug": {...}   # only if RULEBOT_DEBUG=1
         }
     """
-    bot = fetch_bot_by_slug(bot_slug)
+    bot, index = cached_bot(bot_slug)
     if not bot:
         return {
             "matched": False,
@@ -177,7 +354,7 @@ def match_rule(bot_slug: str, user_message: str) -> Dict[str, Any]:
         }
 
     user_norm = normalize_text(user_message)
-    qnas = fetch_qna(bot["id"])
+    qnas = index.rows
     if not qnas:
         return {
             "matched": False,
@@ -187,16 +364,29 @@ def match_rule(bot_slug: str, user_message: str) -> Dict[str, Any]:
             "confidence": 0,
         }
 
-    best_row = None
-    best_score = -10**9
-    best_details = None
+    user_tokens = token_set(user_norm)
+    user_words = matched_words(index, user_norm)
 
-    for row in qnas:
-        s, details = score_qna(user_norm, row)
+    exact_pos = index.exact.get(user_norm)
+    if exact_pos is not None:
+        # The message is one of the questions: answer it without scoring the rest
+        best_row = qnas[exact_pos]
+        best_score, best_details = score_artifacts(
+            user_norm, index.artifacts[exact_pos], index.priorities[exact_pos], user_tokens, user_words
+        )
+        if DEBUG:
+            print(f"[DEBUG] QNA {best_row['id']} exact match score={best_score} :: {best_details}")
+    else:
+        scores = batch_scores(index, user_norm, user_tokens, user_words)
+        best_pos, ratio = rerank_similar(index, user_norm, user_tokens, scores)
+        best_row = qnas[best_pos]
+        best_score, best_details = score_artifacts(
+            user_norm, index.artifacts[best_pos], index.priorities[best_pos], user_tokens, user_words, ratio
+        )
         if DEBUG:
-            print(f"[DEBUG] QNA {row['id']} score={s} :: {details} :: Q='{row['question'][:70]}'")
-        if s > best_score:
-            best_score, best_row, best_details = s, row, details
+            for row, artifacts, priority in zip(qnas, index.artifacts, index.priorities):
+                s, details = score_artifacts(user_norm, artifacts, priority, user_tokens, user_words)
+                print(f"[DEBUG] QNA {row['id']} score={s} :: {details} :: Q='{row['question'][:70]}'")
 
     # Decide if it's a real match:
     kw_hits = len(best_details["matched_keywords"]) + len(best_details["matched_regex"])
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+
+def _close_thread_connection():
+    conn = getattr(db._local, "conn", None)
+    if conn is not None:
+        conn.close()
+    db._local.conn = None
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Point db.py at an empty SQLite file for one test; yields its path."""
+    _close_thread_connection()
+    path = str(tmp_path / "rulebot.db")
+    monkeypatch.setattr(db, "DB_PATH", path)
+    db._notify_write()  # drop anything cached from a previous test's DB
+    yield path
+    _close_thread_connection()
+    db._notify_write()
+
+@pytest.fixture
+def temp_db(db_path):
+    """db.py on a fresh, initialized database."""
+    db.init_db()
+    return db
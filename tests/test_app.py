@@ -0,0 +1,54 @@
+import app as app_module
+from db import create_bot_with_pairs
+
+def client():
+    return app_module.app.test_client()
+
+def test_chat_with_non_string_bot_is_not_found(temp_db):
+    create_bot_with_pairs("cafe", "Cafe", pairs=[("Are you open?", "Yes.", None, 1)])
+    for bot in (["cafe"], {"slug": "cafe"}, 42):
+        resp = client().post("/chat", json={"bot": bot, "message": "Are you open?"})
+        assert resp.status_code == 200
+        assert resp.get_json()["answer"] == "Bot not found."
+
+def test_bot_details_etag_and_304(temp_db):
+    create_bot_with_pairs("cafe", "Cafe", pairs=[("Are you open?", "Yes.", None, 1)])
+    first = client().get("/api/bots/cafe")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.get_json()["pairs"] == [{"question": "Are you open?", "answer": "Yes."}]
+
+    again = client().get("/api/bots/cafe", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.data == b""
+
+def test_bot_details_etag_changes_after_write(temp_db):
+    bot_id = create_bot_with_pairs("cafe", "Cafe", pairs=[("Are you open?", "Yes.", None, 1)])
+    etag = client().get("/api/bots/cafe").headers["ETag"]
+
+    temp_db.add_qna(bot_id, "Do you have WiFi?", "Yes, it's free.")
+    resp = client().get("/api/bots/cafe", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+    assert len(resp.get_json()["pairs"]) == 2
+
+def test_write_during_bot_details_miss_is_not_cached(temp_db, monkeypatch):
+    bot_id = create_bot_with_pairs("cafe", "Cafe", pairs=[("Are you open?", "Yes.", None, 1)])
+    real_fetch_qna = temp_db.fetch_qna
+
+    def fetch_then_write(bot_id):
+        pairs = real_fetch_qna(bot_id)
+        temp_db.add_qna(bot_id, "Do you have WiFi?", "Yes, it's free.")  # lands mid-miss
+        return pairs
+
+    monkeypatch.setattr(temp_db, "fetch_qna", fetch_then_write)
+    assert len(client().get("/api/bots/cafe").get_json()["pairs"]) == 1
+
+    monkeypatch.setattr(temp_db, "fetch_qna", real_fetch_qna)
+    assert len(client().get("/api/bots/cafe").get_json()["pairs"]) == 2
+
+def test_create_bot_with_taken_slug_is_409(temp_db):
+    body = {"slug": "cafe", "name": "Cafe", "pairs": [{"question": "Are you open?", "answer": "Yes."}]}
+    assert client().post("/api/bots", json=body).status_code == 200
+    assert client().post("/api/bots", json=dict(body, name="Other")).status_code == 409
+    assert client().get("/api/bots/cafe").get_json()["name"] == "Cafe"
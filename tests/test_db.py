@@ -0,0 +1,150 @@
+import sqlite3
+
+import db
+from textnorm import NORMALIZER_VERSION
+
+# Schema and rows as written by the original db.py, before the precomputed columns
+BASELINE_SCHEMA = """
+    CREATE TABLE bots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        slug TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        owner_id TEXT,
+        theme TEXT DEFAULT 'light',
+        avatar TEXT,
+        visibility TEXT DEFAULT 'unlisted',
+        fallback_message TEXT DEFAULT 'Sorry!',
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    );
+    CREATE TABLE qna (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        bot_id INTEGER NOT NULL,
+        question TEXT NOT NULL,
+        answer TEXT NOT NULL,
+        keywords TEXT,
+        priority INTEGER DEFAULT 1,
+        created_at TEXT NOT NULL,
+        FOREIGN KEY (bot_id) REFERENCES bots (id) ON DELETE CASCADE
+    );
+    INSERT INTO bots (slug, name, created_at, updated_at) VALUES ('cafe', 'Cafe', 'x', 'x');
+    INSERT INTO qna (bot_id, question, answer, keywords, created_at)
+    VALUES (1, 'Do you have Wi-Fi?', 'Yes.', 'wifi, re:^pass', 'x');
+"""
+
+def stored_columns(qna_id):
+    with db.get_db_connection() as conn:
+        row = conn.execute(
+            "SELECT question, keywords, question_norm, keywords_plain, keywords_regex FROM qna WHERE id = ?",
+            (qna_id,),
+        ).fetchone()
+    return row["question"], row["keywords"], (row["question_norm"], row["keywords_plain"], row["keywords_regex"])
+
+def user_version():
+    with db.get_db_connection() as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def test_init_db_migrates_baseline_database(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.close()
+
+    db.init_db()
+
+    question, keywords, precomputed = stored_columns(1)
+    assert precomputed == db._precompute_qna(question, keywords)
+    assert precomputed[0] == "do you have wi fi"
+    assert user_version() == NORMALIZER_VERSION
+    _, qnas = db.fetch_bot_with_qna("cafe")
+    assert qnas[0]["question_norm"] == "do you have wi fi"
+
+def test_init_db_recomputes_all_rows_when_normalizer_version_changes(temp_db):
+    bot_id = temp_db.create_bot_with_pairs("cafe", "Cafe", pairs=[("Are you open?", "Yes.", "hours", 1)])
+    with temp_db.get_db_connection() as conn:
+        conn.execute("UPDATE qna SET question_norm = 'old normalizer output' WHERE bot_id = ?", (bot_id,))
+
+    temp_db.init_db()  # same version: rows with a value are left alone
+    assert stored_columns(1)[2][0] == "old normalizer output"
+
+    with temp_db.get_db_connection() as conn:
+        conn.execute(f"PRAGMA user_version = {NORMALIZER_VERSION - 1:d}")
+    temp_db.init_db()
+    question, keywords, precomputed = stored_columns(1)
+    assert precomputed == temp_db._precompute_qna(question, keywords)
+    assert user_version() == NORMALIZER_VERSION
+
+def stats_rows():
+    with db.get_db_connection() as conn:
+        return [tuple(row) for row in conn.execute(
+            "SELECT bot_id, daily_sessions, message_count FROM bot_stats ORDER BY bot_id"
+        )]
+
+def quiet_stats(monkeypatch, flush_ops=1000):
+    """Fresh stats buffer, with the background flusher effectively idle."""
+    monkeypatch.setattr(db, "_stats_buffer", {})
+    monkeypatch.setattr(db, "_stats_ops", 0)
+    monkeypatch.setattr(db, "STATS_FLUSH_INTERVAL", 3600)
+    monkeypatch.setattr(db, "STATS_FLUSH_OPS", flush_ops)
+
+def test_stats_increments_are_buffered_until_flushed(temp_db, monkeypatch):
+    quiet_stats(monkeypatch)
+    bot_id = temp_db.create_bot_with_pairs("cafe", "Cafe")
+    temp_db.increment_bot_stats(bot_id, sessions=1, messages=1)
+    temp_db.increment_bot_stats(bot_id, messages=2)
+    assert stats_rows() == []
+
+    assert temp_db.flush_bot_stats()
+    assert stats_rows() == [(bot_id, 1, 3)]
+
+    temp_db.increment_bot_stats(bot_id, messages=1)
+    assert temp_db.flush_bot_stats()
+    assert stats_rows() == [(bot_id, 1, 4)]
+
+def test_stats_flush_after_stats_flush_ops_increments(temp_db, monkeypatch):
+    quiet_stats(monkeypatch, flush_ops=3)
+    bot_id = temp_db.create_bot_with_pairs("cafe", "Cafe")
+    for _ in range(2):
+        temp_db.increment_bot_stats(bot_id, messages=1)
+    assert stats_rows() == []
+    temp_db.increment_bot_stats(bot_id, messages=1)
+    assert stats_rows() == [(bot_id, 0, 3)]
+
+def test_failed_stats_flush_keeps_increments_for_retry(temp_db, monkeypatch, capsys):
+    quiet_stats(monkeypatch)
+    bot_id = temp_db.create_bot_with_pairs("cafe", "Cafe")
+    temp_db.increment_bot_stats(bot_id, sessions=1, messages=2)
+
+    real_connection = temp_db.get_db_connection
+
+    def locked():
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(temp_db, "get_db_connection", locked)
+    assert not temp_db.flush_bot_stats()
+    assert "Error updating bot stats" in capsys.readouterr().out
+
+    temp_db.increment_bot_stats(bot_id, messages=1)
+    monkeypatch.setattr(temp_db, "get_db_connection", real_connection)
+    assert temp_db.flush_bot_stats()
+    assert stats_rows() == [(bot_id, 1, 3)]
+
+def test_create_bot_with_pairs_duplicate_slug_rolls_back(temp_db, capsys):
+    first = temp_db.create_bot_with_pairs("cafe", "Cafe", pairs=[("Are you open?", "Yes.", None, 1)])
+    assert temp_db.create_bot_with_pairs("cafe", "Other", pairs=[("Any WiFi?", "No.", None, 1)]) is None
+    assert "already exists" in capsys.readouterr().out
+
+    with temp_db.get_db_connection() as conn:
+        assert not conn.in_transaction
+        assert conn.execute("SELECT COUNT(*) FROM bots").fetchone()[0] == 1
+        assert [r["bot_id"] for r in conn.execute("SELECT bot_id FROM qna")] == [first]
+
+    # The connection is still usable for the next write
+    assert temp_db.create_bot_with_pairs("tech", "Tech", pairs=[("Any WiFi?", "No.", None, 1)])
+
+def test_create_bot_with_pairs_failing_pair_rolls_back_bot(temp_db, capsys):
+    pairs = [("Are you open?", "Yes.", None, 1), ("Any WiFi?", None, None, 1)]  # answer is NOT NULL
+    assert temp_db.create_bot_with_pairs("cafe", "Cafe", pairs=pairs) is None
+    assert temp_db.fetch_bot_by_slug("cafe") is None
+    with temp_db.get_db_connection() as conn:
+        assert not conn.in_transaction
+        assert conn.execute("SELECT COUNT(*) FROM qna").fetchone()[0] == 0
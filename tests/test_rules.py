@@ -0,0 +1,112 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import add_sample_data
+import rules
+from db import _precompute_qna
+
+VOCAB = "wifi password coffee hours open reset gift card book table vegan milk oat time wait".split()
+GLUE = [" ", " ", " ", "—", "…", "’", "🙂", "☕", "-", "?", "!", ""]
+
+def make_row(qna_id, question, keywords, priority):
+    question_norm, keywords_plain, keywords_regex = _precompute_qna(question, keywords)
+    return {
+        "id": qna_id,
+        "question": question,
+        "answer": question,
+        "keywords": keywords,
+        "priority": priority,
+        "question_norm": question_norm,
+        "keywords_plain": keywords_plain,
+        "keywords_regex": keywords_regex,
+    }
+
+def make_index(rows):
+    rows = sorted(rows, key=lambda r: (-(r["priority"] or 0), r["id"]))
+    return rules.build_index(tuple(rows))
+
+def reference_scores(index, user_norm):
+    """score_qna() totals without the exact bonus, which batch_scores never adds."""
+    scores = []
+    for row in index.rows:
+        s, details = rules.score_qna(user_norm, row)
+        if details["exact"]:
+            s -= rules.EXACT_MATCH_BONUS
+        scores.append(s)
+    return scores
+
+def batch(index, user_norm):
+    user_tokens = rules.token_set(user_norm)
+    user_words = rules.matched_words(index, user_norm)
+    return rules.batch_scores(index, user_norm, user_tokens, user_words)
+
+def test_batch_scores_match_score_qna():
+    rng = random.Random(1234)
+    rows = []
+    for i in range(300):
+        question = " ".join(rng.choices(VOCAB, k=rng.randint(1, 6))) + "?"
+        kws = [rng.choice(VOCAB) for _ in range(rng.randint(0, 4))]
+        if rng.random() < 0.2:
+            kws.append(" ".join(rng.choices(VOCAB, k=2)))
+        if rng.random() < 0.1:
+            kws.append("re:^" + rng.choice(VOCAB))
+        rows.append(make_row(i, question, ",".join(kws) or None, rng.choice([None, 1, 5, 10])))
+    index = make_index(rows)
+
+    for _ in range(2000):
+        words = rng.choices(VOCAB + ["ca", "xyz", "Wi-Fi", "CAFÉ"], k=rng.randint(0, 5))
+        message = "".join(w + rng.choice(GLUE) for w in words)
+        user_norm = rules.normalize_text(message)
+        assert batch(index, user_norm) == reference_scores(index, user_norm), message
+
+def test_keyword_glued_to_non_ascii_punctuation_still_matches():
+    index = make_index([
+        make_row(1, "Do you have WiFi?", "wifi,internet", 5),
+        make_row(2, "What are your hours?", "hours", 1),
+    ])
+    for message in ("wifi—password", "wifi…", "internet🙂"):
+        user_norm = rules.normalize_text(message)
+        assert batch(index, user_norm) == reference_scores(index, user_norm), message
+
+def test_normalize_text_strips_non_ascii_punctuation():
+    assert rules.normalize_text("What’s your phone number?") == rules.normalize_text("What's your phone number?")
+    assert rules.normalize_text("Hours — today?") == "hours today"
+    assert rules.normalize_text("internet🙂") == "internet"
+    assert rules.normalize_text("  Do you have WiFi?  ") == "do you have wifi"
+
+def test_write_during_cache_miss_is_not_served_stale(temp_db, monkeypatch):
+    bot_id = temp_db.create_bot_with_pairs("cafe", "Cafe", pairs=[("Are you open?", "Yes.", None, 1)])
+    real_fetch = rules.fetch_bot_with_qna
+
+    def fetch_then_write(slug):
+        result = real_fetch(slug)
+        temp_db.add_qna(bot_id, "Do you have WiFi?", "Yes, it's free.")  # lands mid-miss
+        return result
+
+    monkeypatch.setattr(rules, "fetch_bot_with_qna", fetch_then_write)
+    _, stale = rules.cached_bot("cafe")
+    assert len(stale.rows) == 1
+
+    monkeypatch.setattr(rules, "fetch_bot_with_qna", real_fetch)
+    _, fresh = rules.cached_bot("cafe")
+    assert len(fresh.rows) == 2
+    assert rules.match_rule("cafe", "Do you have WiFi?")["answer"] == "Yes, it's free."
+
+def test_near_miss_messages_match_sample_questions(temp_db, capsys):
+    add_sample_data.create_sample_bot()
+    add_sample_data.create_tech_support_bot()
+    near_misses = [
+        ("cozy-cafe", "Do you sell giftcards?", "Do you sell gift cards?"),
+        ("cozy-cafe", "Do you haveWiFi", "Do you have WiFi?"),
+        ("cozy-cafe", "Whatcoffee do you serve", "What coffee do you serve?"),
+        ("cozy-cafe", "Do you have vgan options?", "Do you have vegan options?"),
+        ("tech-helper", "what browsers", "What browsers do you support?"),
+        ("tech-helper", "What browsers do yousupport", "What browsers do you support?"),
+    ]
+    for slug, message, question in near_misses:
+        result = rules.match_rule(slug, message)
+        assert result["matched"], message
+        assert result["question"] == question, message
@@ -0,0 +1,77 @@
+"""
+Text helpers shared by the rule engine (rules.py) and the database layer (db.py).
+- db.py uses them to precompute normalized questions/keywords at write time.
+- rules.py uses them on incoming messages and on rows written before that.
+"""
+
+from __future__ import annotations
+import re
+from typing import List, Optional, Tuple
+
+# Bump whenever normalize_text() or split_keywords() output changes: db.init_db()
+# then recomputes the question_norm/keywords_* columns stored with every Q&A.
+NORMALIZER_VERSION = 1
+
+# Every ASCII char other than [a-z0-9] and whitespace -> space (input is lowercased first)
+_ascii_strip = str.maketrans({
+    c: " " for c in map(chr, range(128)) if not (c.isalnum() or c.isspace())
+})
+_strip_chars = re.compile(r"[^a-z0-9\s]+")
+
+def normalize_text(text: str) -> str:
+    """Lowercase, strip punctuation (keep spaces), collapse whitespace."""
+    t = text.lower()
+    if t.isascii():
+        # Fast path: one C-level translate instead of a regex pass
+        t = t.translate(_ascii_strip)
+    else:
+        # Smart quotes, dashes, emoji, accented letters... all become spaces
+        t = _strip_chars.sub(" ", t)
+    return " ".join(t.split())
+
+def split_keywords(keywords: Optional[str]) -> Tuple[List[str], List[Tuple[str, int]]]:
+    """
+    Split a CSV keywords string into:
+      - plain phrases (list[str])
+      - regex specs (list[(pattern, flags)]); patterns that don't compile are dropped
+    Conventions:
+      - 're:^foo$'   -> regex
+      - '/foo|bar/i' -> regex (with trailing '/i' for IGNORECASE)
+      - plain words/phrases -> phrase matches
+    """
+    plain: List[str] = []
+    regexes: List[Tuple[str, int]] = []
+    if not keywords:
+        return plain, regexes
+
+    for raw in keywords.split(","):
+        kw = raw.strip()
+        if not kw:
+            continue
+
+        # re: pattern
+        if kw.startswith("re:"):
+            pat = kw[3:].strip()
+            flags = re.IGNORECASE
+        # /pattern/flags
+        elif len(kw) >= 2 and kw.startswith("/") and kw.count("/") >= 2:
+            # find last slash
+            last = kw.rfind("/")
+            pat = kw[1:last]
+            flags_str = kw[last + 1:].lower()
+            flags = 0
+            if "i" in flags_str:
+                flags |= re.IGNORECASE
+        else:
+            # otherwise a plain phrase
+            plain.append(kw.lower())
+            continue
+
+        try:
+            re.compile(pat, flags=flags)
+        except re.error:
+            # ignore bad regex silently
+            continue
+        regexes.append((pat, int(flags)))
+
+    return plain, regexes